@@ -4,9 +4,10 @@
 # 
 # Estructura del código:
 #   - BayesianNode: representa un nodo (variable booleana) con su CPT
+#   - Factor: tabla multidimensional usada por eliminación de variables
 #   - BayesianNetwork: representa la red completa (nodos y arcos)
 #   - BNFileLoader: utilidades para cargar estructura y CPTs desde archivos
-#   - InferenceEngine: implementación de enumeración-ask con trazas
+#   - InferenceEngine: eliminación de variables (VE) y enumeración-ask con trazas
 #
 # Archivos de entrada:
 #   - estructura.txt  (formato: "A,B -> C" o "- -> Root")
@@ -20,8 +21,73 @@ from __future__ import annotations  # Habilita referenciar clases que se definen
 from dataclasses import dataclass, field        # dataclass simplifica clases de datos; field para defaults mutables
 from typing import Dict, List, Tuple, Optional  # Tipos para claridad: diccionarios, listas, tuplas, opcionales
 import json                                     # Para leer y parsear cpts.json (tablas de prob.)
-import itertools                                # (No se usa finalmente, pero sirve para combinaciones si amplías)
+import math                                     # math.fsum: suma compensada para la normalización
+
+# orjson es opcional: parsea JSON en C (~3-6x más rápido que el stdlib) y
+# produce exactamente los mismos dicts; si no está instalado, usamos json.
+try:
+    import orjson as _json_fast  # type: ignore
+except ImportError:
+    _json_fast = None
+import itertools                                # Para generar combinaciones T/F de los padres al construir factores
 import os                                       # Para verificar existencia de archivos en el sistema
+import re                                       # Regex precompilada para parsear estructura.txt
+import string                                   # Letras para los subíndices de np.einsum
+import numpy as np                              # Arreglos multidimensionales para los factores de VE
+
+# Alfabeto de subíndices para np.einsum (52 letras: suficiente para cualquier
+# factor razonable; un factor booleano con más variables no cabría en memoria)
+EINSUM_LETTERS = string.ascii_letters
+
+# Numba es opcional: si está instalado, la enumeración sin traza se compila
+# a código máquina; si no, se usa la recursión en Python puro (memoizada).
+try:
+    from numba import njit  # type: ignore
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+
+def _enumerate_all_kernel(i, n, assign, is_set, cpt_flat, cpt_off,
+                          par_ids_flat, par_off, par_strides_flat):
+    """
+    Núcleo de enumeración sobre los arreglos planos del motor (layout CSR:
+    par_ids_flat/par_strides_flat concatenados, par_off como indptr).
+    Solo usa índices enteros y aritmética de flotantes, así que Numba puede
+    compilarlo en modo nopython; sin Numba corre igual en Python puro.
+    """
+    if i == n:                      # Caso base: producto neutro
+        return 1.0
+    # Índice plano de la CPT a partir de los padres (fila CSR de la variable i)
+    flat_index = 0
+    for j in range(par_off[i], par_off[i + 1]):
+        flat_index += assign[par_ids_flat[j]] * par_strides_flat[j]
+    p_true = cpt_flat[cpt_off[i] + flat_index]
+
+    if is_set[i]:                   # Variable fijada: multiplicar y descender
+        prob = p_true if assign[i] == 1 else 1.0 - p_true
+        if prob == 0.0:             # Todo el subárbol se multiplicaría por 0
+            return 0.0
+        return prob * _enumerate_all_kernel(i + 1, n, assign, is_set, cpt_flat,
+                                            cpt_off, par_ids_flat, par_off,
+                                            par_strides_flat)
+    # Variable oculta: sumar sobre sus dos valores
+    total = 0.0
+    is_set[i] = True
+    for val in (1, 0):
+        assign[i] = val
+        prob = p_true if val == 1 else 1.0 - p_true
+        if prob == 0.0:             # Rama con probabilidad 0: no aporta nada
+            continue
+        total += prob * _enumerate_all_kernel(i + 1, n, assign, is_set, cpt_flat,
+                                              cpt_off, par_ids_flat, par_off,
+                                              par_strides_flat)
+    is_set[i] = False
+    return total
+
+
+if HAVE_NUMBA:  # Compilamos el núcleo una sola vez (la caché persiste en disco)
+    _enumerate_all_kernel = njit(cache=True)(_enumerate_all_kernel)
 
 
 # ------------------------------------------------------------
@@ -30,49 +96,41 @@ import os                                       # Para verificar existencia de a
 # - name: nombre del nodo (string)
 # - parents: lista de nombres de padres en orden (importante para la CPT)
 # - children: lista de nombres de hijos (se llena al construir la red)
-# - cpt_true: dict que mapea "clave de padres" -> P(node=True | padres)
+# - cpt_true: np.ndarray de shape (2,)*len(parents) con P(node=True | padres),
+#   indexado por la tupla booleana de los padres en el orden de self.parents
+#   (True -> 1, False -> 0). Sin padres, es un arreglo 0-dimensional.
 #
-# La "clave de padres" es una cadena tipo "A=T,B=F" respetando el orden de self.parents.
-# Si no hay padres, la clave es "" (cadena vacía).
+# En cpts.json las filas siguen escribiéndose como "A=T,B=F"; el loader las
+# convierte al arreglo para que cada consulta sea un índice C en lugar de
+# formatear una clave y hacer un lookup de diccionario.
 # ------------------------------------------------------------
 @dataclass  # Convierte la clase en contenedor de datos con __init__ y otros métodos auto-generados
 class BayesianNode:
     name: str  # Nombre único del nodo (variable) en la red
     parents: List[str] = field(default_factory=list)   # Lista ordenada de nombres de padres (vacía si no tiene)
     children: List[str] = field(default_factory=list)  # Lista de nombres de hijos (se llena al conectar)
-    cpt_true: Dict[str, float] = field(default_factory=dict)  # CPT: clave de padres -> P(nodo=True | padres)
+    children_set: set = field(default_factory=set)     # Mismos hijos como set, para deduplicar en O(1)
+    cpt_true: Optional[np.ndarray] = None              # CPT: arreglo (2,)*k con P(nodo=True | padres); None hasta cargarla
 
     def p_true_given(self, parent_assignment: Dict[str, bool]) -> float:
         """
-        Retorna P(self=True | parent_assignment) usando la clave de padres
-        en el mismo orden declarado en self.parents.
+        Retorna P(self=True | parent_assignment) indexando la CPT con la
+        tupla booleana de los padres en el mismo orden de self.parents.
 
         parent_assignment: dict {parent_name: bool}  # Asignación booleana de cada padre
 
         Ejemplo:
             Si parents = ["A","B"] y parent_assignment = {"A": True, "B": False},
-            la clave formada será "A=T,B=F".
+            el índice usado será (1, 0).
         """
-        # Construir la clave en el orden exacto de self.parents
-        if not self.parents:  # Si no hay padres...
-            # Sin padres -> clave vacía
-            key = ""  # key será "" para consultar la probabilidad marginal del nodo
-        else:
-            # Unimos "Nombre=Valor" con comas según el orden fijo
-            # Nota: 'T' para True y 'F' para False
-            parts = []  # parts acumula cada "Padre=T/F" respetando el orden de self.parents
-            for p in self.parents:           # Recorremos los padres en su orden
-                val = parent_assignment[p]   # val es el bool asignado al padre p
-                parts.append(f"{p}={'T' if val else 'F'}")  # Agregamos "p=T" o "p=F" según val
-            key = ",".join(parts)  # key final: "A=T,B=F" (mismo orden que self.parents)
-
-        # Buscar probabilidad en la CPT
-        if key not in self.cpt_true:  # Validamos que exista la fila correspondiente en la CPT
+        if self.cpt_true is None:  # La CPT se asigna al cargar cpts.json
             raise KeyError(
-                f"No existe una entrada CPT para el nodo '{self.name}' con clave de padres '{key}'. "
-                f"Verifica el archivo cpts.json y el orden de 'parents'."
+                f"El nodo '{self.name}' no tiene CPT cargada. Verifica el archivo cpts.json."
             )
-        return self.cpt_true[key]  # Retornamos P(node=True | padres) correspondiente a esa clave
+        # Índice booleano en el orden exacto de self.parents (True->1, False->0);
+        # la tupla vacía indexa el arreglo 0-dimensional del caso sin padres.
+        index = tuple(1 if parent_assignment[p] else 0 for p in self.parents)
+        return float(self.cpt_true[index])  # Un solo acceso a nivel C en lugar de f-strings + hash
 
     def p_value_given(self, value: bool, parent_assignment: Dict[str, bool]) -> float:
         """
@@ -82,6 +140,25 @@ class BayesianNode:
         return p_true if value else (1.0 - p_true)     # Si pedimos False, retornamos el complemento
 
 
+# ------------------------------------------------------------
+# Clase: Factor
+# Tabla multidimensional sobre un subconjunto de variables booleanas,
+# usada por el algoritmo de eliminación de variables (VE).
+# - vars: lista ordenada de nombres de variables (una por eje del arreglo)
+# - values: np.ndarray de shape (2,)*len(vars); el índice 1 representa True
+#           y el índice 0 representa False en cada eje.
+# ------------------------------------------------------------
+@dataclass  # Contenedor simple: solo variables y valores
+class Factor:
+    vars: List[str]                 # Variables del factor, en el orden de los ejes del arreglo
+    values: np.ndarray              # Valores del factor; eje i corresponde a vars[i]
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        """Shape del arreglo de valores: (2,)*len(vars)."""
+        return self.values.shape  # Delegamos directamente en numpy
+
+
 # ------------------------------------------------------------
 # Clase: BayesianNetwork
 # Contiene todos los nodos y provee utilidades:
@@ -94,12 +171,66 @@ class BayesianNetwork:
     def __init__(self):
         # Diccionario: nombre -> BayesianNode
         self.nodes: Dict[str, BayesianNode] = {}  # Almacena cada nodo de la red por su nombre
+        # Cachés de orden topológico y raíces; se invalidan al mutar la red
+        self._topo_cache: Optional[List[str]] = None
+        self._roots_cache: Optional[List[str]] = None
+        # Vista SoA (structure-of-arrays) de la red; se construye bajo demanda
+        self._soa_valid: bool = False
+        self.name_to_id: Dict[str, int] = {}          # nombre -> id entero (orden topológico)
+        self.id_to_name: List[str] = []               # id entero -> nombre
+        self.parents_csr: Tuple[np.ndarray, np.ndarray] = (np.zeros(1, dtype=np.int64),
+                                                           np.zeros(0, dtype=np.int64))
+        self.children_csr: Tuple[np.ndarray, np.ndarray] = (np.zeros(1, dtype=np.int64),
+                                                            np.zeros(0, dtype=np.int64))
+        self.cpt_arrays: List[np.ndarray] = []        # CPT de cada nodo, indexada por id
+
+    def _invalidate_caches(self) -> None:
+        """Descarta los resultados cacheados tras modificar nodos o arcos."""
+        self._topo_cache = None
+        self._roots_cache = None
+        self._soa_valid = False
+
+    def build_soa(self) -> None:
+        """
+        Construye (y cachea) la vista SoA de la red: arreglos paralelos
+        indexados por id entero en orden topológico, en lugar del grafo de
+        objetos BayesianNode. Los caminos calientes del motor de inferencia
+        recorren estos arreglos contiguos; los objetos BayesianNode quedan
+        para las APIs de descripción y carga.
+
+        - name_to_id / id_to_name: mapeo nombre <-> id
+        - parents_csr / children_csr: (indptr, data) con los ids de padres e
+          hijos de cada nodo concatenados (layout CSR)
+        - cpt_arrays: lista de CPTs (arreglos (2,)*k) indexada por id
+        """
+        if self._soa_valid:                       # Vista ya construida para esta red
+            return
+        order = self.topological_order()          # Ids en orden topológico
+        self.name_to_id = {name: i for i, name in enumerate(order)}
+        self.id_to_name = list(order)
+        n = len(order)
+
+        def to_csr(rows: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+            # Filas de ids concatenadas en un arreglo plano + indptr de offsets
+            indptr = np.zeros(n + 1, dtype=np.int64)
+            for i, row in enumerate(rows):
+                indptr[i + 1] = indptr[i] + len(row)
+            data = np.array([j for row in rows for j in row], dtype=np.int64)
+            return indptr, data
+
+        self.parents_csr = to_csr([[self.name_to_id[p] for p in self.nodes[name].parents]
+                                   for name in order])
+        self.children_csr = to_csr([[self.name_to_id[c] for c in self.nodes[name].children]
+                                    for name in order])
+        self.cpt_arrays = [self.nodes[name].cpt_true for name in order]
+        self._soa_valid = True
 
     # --- creación / acceso básico ---
     def add_node(self, node: BayesianNode) -> None:
         if node.name in self.nodes:  # Evita duplicados de nombre
             raise ValueError(f"El nodo '{node.name}' ya existe en la red.")
         self.nodes[node.name] = node  # Inserta el nodo en el diccionario
+        self._invalidate_caches()     # La red cambió: el orden cacheado ya no vale
 
     def get_node(self, name: str) -> BayesianNode:
         if name not in self.nodes:  # Valida que exista
@@ -112,8 +243,15 @@ class BayesianNetwork:
         """
         if name not in self.nodes:                 # Si no lo tenemos aún...
             self.nodes[name] = BayesianNode(name=name)  # ...creamos un nodo con ese nombre
+            self._invalidate_caches()              # Nodo nuevo: invalidamos cachés
         return self.nodes[name]                    # Retornamos el nodo (existente o recién creado)
 
+    def roots(self) -> List[str]:
+        """Nombres de los nodos sin padres (cacheado hasta que la red cambie)."""
+        if self._roots_cache is None:
+            self._roots_cache = [name for name, node in self.nodes.items() if not node.parents]
+        return self._roots_cache
+
     # --- conectar estructura ---
     def connect(self, parents: List[str], child: str) -> None:
         """
@@ -122,36 +260,49 @@ class BayesianNetwork:
         """
         child_node = self.ensure_node(child)  # child_node es el objeto del hijo; lo crea si no existe
         # Establecemos el orden explícito de padres en el nodo hijo
-        child_node.parents = parents[:]       # Copiamos la lista para fijar el orden de padres
+        # (el llamador construye una lista nueva por línea; no hace falta copiarla)
+        child_node.parents = list(parents)    # Aceptamos lista o tupla y fijamos el orden de padres
         # Registramos el hijo en cada padre
         for p in parents:                                 # Para cada padre p...
             parent_node = self.ensure_node(p)             # Aseguramos que el nodo padre exista
-            if child not in parent_node.children:         # Evitamos duplicarlo si ya estaba
-                parent_node.children.append(child)        # Añadimos el hijo a la lista de hijos del padre
+            if child not in parent_node.children_set:     # Dedupe en O(1) vía set, no escaneo lineal
+                parent_node.children_set.add(child)       # Marcamos el hijo como ya registrado
+                parent_node.children.append(child)        # Y lo añadimos a la lista (conserva el orden)
+        self._invalidate_caches()                         # Cambiaron los arcos: invalidamos cachés
 
     # --- orden topológico (necesario para la enumeración) ---
     def topological_order(self) -> List[str]:
         """
         Devuelve una lista de nombres de nodos en orden topológico:
         todo padre aparece antes que sus hijos.
+        El resultado se cachea; cada consulta posterior es O(1) hasta que
+        la red vuelva a mutar (add_node / ensure_node / connect).
         """
-        # Conteo de entradas (in-degree) basado en cantidad de padres
-        in_degree = {name: len(node.parents) for name, node in self.nodes.items()}  # Grado de entrada por nodo
+        if self._topo_cache is not None:   # Resultado ya calculado para esta red
+            return self._topo_cache
+
+        # Ids enteros locales para contar in-degree en una lista plana
+        # (decrementos por índice, sin hashing de nombres)
+        idx = {name: i for i, name in enumerate(self.nodes)}   # nombre -> id entero
+        names = list(self.nodes)                               # id entero -> nombre
+        in_degree = [len(node.parents) for node in self.nodes.values()]  # Grado de entrada por id
         # Cola inicial: nodos sin padres
-        frontier = [name for name, deg in in_degree.items() if deg == 0]  # Nodos raíz (deg=0)
+        frontier = [i for i, deg in enumerate(in_degree) if deg == 0]  # Nodos raíz (deg=0)
         order: List[str] = []  # Aquí iremos colocando el orden resultante
 
         # Algoritmo de Kahn
         while frontier:                # Mientras haya nodos sin dependencias por procesar...
-            n = frontier.pop()         # Tomamos uno (LIFO aquí, podría ser FIFO igual)
-            order.append(n)            # Lo agregamos al orden
-            for child in self.nodes[n].children:  # Para cada hijo del nodo n...
-                in_degree[child] -= 1             # Reducimos su grado de entrada (hemos resuelto uno de sus padres)
-                if in_degree[child] == 0:         # Si ya no tiene padres pendientes...
-                    frontier.append(child)        # Lo agregamos a la frontera
+            i = frontier.pop()         # Tomamos uno (LIFO aquí, podría ser FIFO igual)
+            order.append(names[i])     # Lo agregamos al orden
+            for child in self.nodes[names[i]].children:  # Para cada hijo del nodo...
+                j = idx[child]                    # Id del hijo
+                in_degree[j] -= 1                 # Reducimos su grado de entrada (hemos resuelto uno de sus padres)
+                if in_degree[j] == 0:             # Si ya no tiene padres pendientes...
+                    frontier.append(j)            # Lo agregamos a la frontera
 
         if len(order) != len(self.nodes):  # Si no cubrimos todos, hay ciclo (no es DAG válido)
             raise RuntimeError("La red parece contener ciclos (no es un DAG). Revisa la estructura.")
+        self._topo_cache = order  # Memorizamos hasta la próxima mutación
         return order  # Retornamos la lista en orden topológico válido
 
     # --- utilidades de impresión ---
@@ -179,13 +330,18 @@ class BayesianNetwork:
             node = self.nodes[name]                  # Obtenemos el BayesianNode
             lines.append(f"[{name}]")               # Sección para ese nodo
             if not node.parents:                    # Si no tiene padres...
-                p = node.cpt_true.get("", None)     # Probabilidad marginal P(name=True) está en clave ""
+                p = None if node.cpt_true is None else float(node.cpt_true)  # Arreglo 0-dim -> escalar
                 lines.append(f"  (sin padres)  P({name}=T) = {p}")  # Imprimimos esa prob.
             else:
                 lines.append(f"  padres: {', '.join(node.parents)}")  # Listamos padres en orden
-                # Ordenar por clave para una salida estable
-                for key in sorted(node.cpt_true.keys()):              # Iteramos filas de CPT ordenadas por clave
-                    lines.append(f"  {key}  ->  P({name}=T) = {node.cpt_true[key]}")  # Mostramos cada fila
+                # Reconstruimos las claves "A=T,B=F" desde el arreglo y ordenamos para salida estable
+                rows = []
+                for combo in itertools.product([False, True], repeat=len(node.parents)):
+                    key = ",".join(f"{pn}={'T' if v else 'F'}" for pn, v in zip(node.parents, combo))
+                    p = float(node.cpt_true[tuple(int(v) for v in combo)])  # Fila correspondiente
+                    rows.append((key, p))
+                for key, p in sorted(rows):                           # Iteramos filas de CPT ordenadas por clave
+                    lines.append(f"  {key}  ->  P({name}=T) = {p}")   # Mostramos cada fila
             lines.append("")  # línea en blanco para separar nodos
         return "\n".join(lines)  # Unimos todo en un string
 
@@ -196,6 +352,10 @@ class BayesianNetwork:
 # construir/llenar la BayesianNetwork.
 # ------------------------------------------------------------
 class BNFileLoader:
+    # Regex precompilada para una línea de estructura: "- -> Hijo" o "A,B -> Hijo".
+    # Grupo 1: lista de padres (None cuando la izquierda es '-'), grupo 2: hijo.
+    LINE_RE = re.compile(r"^\s*(?:-|([\w, ]+?))\s*->\s*(\w+)\s*$")
+
     @staticmethod  # Método estático: no necesita instancia de BNFileLoader
     def load_structure(path: str, bn: BayesianNetwork) -> None:
         """
@@ -209,16 +369,15 @@ class BNFileLoader:
 
         with open(path, "r", encoding="utf-8") as f:  # Abrimos el archivo en modo lectura
             for raw in f:                             # raw es la línea cruda con saltos
-                line = raw.strip()                    # line limpia espacios en extremos
-                if not line or line.startswith("#"):  # Saltamos líneas vacías o comentarios
+                if not raw.strip() or raw.lstrip().startswith("#"):  # Saltamos vacías y comentarios
                     continue
-                # Separar "izquierda -> derecha"
-                if "->" not in line:                  # Validamos el separador requerido
-                    raise ValueError(f"Línea inválida en estructura: '{line}' (falta '->')")
-                left, right = [part.strip() for part in line.split("->")]  # Split por '->' y limpiamos espacios
-                child = right                     # child es el nombre del nodo hijo a conectar
-                if left == "-" or left == "":     # Si a la izquierda hay '-' o vacío, no hay padres
-                    parents: List[str] = []       # Lista de padres vacía
+                # Un solo match de regex por línea en lugar de strip/split encadenados
+                m = BNFileLoader.LINE_RE.match(raw)
+                if m is None:                         # Línea que no respeta "padres -> hijo"
+                    raise ValueError(f"Línea inválida en estructura: '{raw.strip()}' (se espera 'A,B -> C' o '- -> C')")
+                left, child = m.group(1), m.group(2)  # left es None cuando la izquierda es '-'
+                if left is None:                      # Sin padres (nodo raíz)
+                    parents: List[str] = []
                 else:
                     parents = [p.strip() for p in left.split(",") if p.strip()]  # Parseamos múltiples padres
                 # Conectar en la red
@@ -234,8 +393,10 @@ class BNFileLoader:
         if not os.path.exists(path):  # Validamos que el archivo exista
             raise FileNotFoundError(f"No se encontró el archivo de CPTs: {path}")
 
-        with open(path, "r", encoding="utf-8") as f:  # Abrimos el JSON
-            data = json.load(f)                       # data es un dict con nodos -> especificación
+        with open(path, "rb") as f:   # Bytes crudos: ambos parsers aceptan UTF-8 directamente
+            raw = f.read()
+        # orjson si está disponible (parser en C); si no, el json del stdlib
+        data = _json_fast.loads(raw) if _json_fast is not None else json.loads(raw)
 
         for node_name, spec in data.items():     # Recorremos cada entrada del JSON
             # Debe existir el nodo en la red (creado al leer la estructura)
@@ -255,19 +416,53 @@ class BNFileLoader:
                     f"Asegúrate de que el orden y los nombres coincidan."
                 )
 
-            # Guardar la CPT en el nodo
-            # Nota: no convertimos claves; las usamos como vienen ("A=T,B=F" o "")
-            node.cpt_true = table  # Asignamos la tabla tal cual (P(True|...))
+            # Convertir la tabla con claves "A=T,B=F" a un arreglo (2,)*k
+            # indexado por la tupla booleana de los padres (True->1, False->0)
+            k = len(node.parents)                       # Número de padres -> dimensiones del arreglo
+            arr = np.full((2,) * k, np.nan)             # NaN marca filas aún no llenadas
+            for key, p in table.items():                # Recorremos cada fila del JSON
+                if k == 0:                              # Sin padres: única fila con clave ""
+                    if key != "":
+                        raise ValueError(
+                            f"El nodo '{node_name}' no tiene padres; la clave de su tabla debe ser \"\" "
+                            f"pero se encontró '{key}'."
+                        )
+                    index: Tuple[int, ...] = ()         # Tupla vacía indexa el arreglo 0-dimensional
+                else:
+                    # Parseamos "Padre=T/F" por partes y armamos el índice en el orden de node.parents
+                    row = {}                            # row: padre -> bool según esta clave
+                    for part in key.split(","):
+                        pname, _, pval = part.strip().partition("=")
+                        row[pname] = (pval == "T")
+                    if set(row) != set(node.parents):   # La fila debe mencionar exactamente a los padres
+                        raise ValueError(
+                            f"La clave '{key}' de la CPT de '{node_name}' no coincide con sus padres "
+                            f"{node.parents}. Verifica el archivo cpts.json."
+                        )
+                    index = tuple(1 if row[pn] else 0 for pn in node.parents)
+                arr[index] = float(p)                   # Guardamos P(node=True | esa combinación)
+            if np.isnan(arr).any():                     # Toda combinación de padres debe tener fila
+                raise ValueError(
+                    f"La CPT de '{node_name}' está incompleta: faltan filas para algunas "
+                    f"combinaciones de padres. Verifica el archivo cpts.json."
+                )
+            node.cpt_true = arr  # Asignamos el arreglo ya validado (P(True|...))
 
 
 # ------------------------------------------------------------
 # Clase: InferenceEngine
-# Implementa enumeración-ask con traza.
+# Implementa dos métodos de inferencia exacta:
+#
+#  1) Eliminación de variables (VE), el método por defecto:
+#       P(X|e) se obtiene restringiendo cada CPT por la evidencia y
+#       eliminando (multiplicar + sumar) cada variable oculta.
+#     Complejidad O(n·2^w) con w el treewidth inducido, en lugar del
+#     O(2^n) de la enumeración que recalcula subproblemas repetidos.
 #
-# Fórmula clásica:
-#   enumerate_ask(X, e) devuelve distribución normalizada sobre X:
+#  2) Enumeración-ask (method="enum"), la fórmula clásica:
 #       P(X|e) ∝ ∑_y P(x, y, e)
-#   usando recursion enumerate_all(vars, e)
+#     usando la recursión enumerate_all(vars, e), útil por su traza
+#     paso a paso con fines didácticos.
 #
 # Esta implementación:
 #  - Variables booleanas
@@ -276,25 +471,243 @@ class BNFileLoader:
 #  - trace: si True, imprime pasos de cálculo (claros y simples)
 # ------------------------------------------------------------
 class InferenceEngine:
-    def __init__(self, bn: BayesianNetwork):
+    def __init__(self, bn: BayesianNetwork, dtype=np.float64):
+        """
+        dtype: tipo de los arreglos de factores de VE. Por defecto float64;
+        con np.float32 los factores ocupan la mitad de memoria (relevante en
+        redes grandes, donde el producto de factores es memoria-limitada), a
+        costa de un error relativo de ~1e-7. Las normalizaciones finales se
+        acumulan siempre en float64, sea cual sea el dtype de almacenamiento.
+        """
         self.bn = bn                             # Guardamos la referencia a la red bayesiana
+        self.dtype = np.dtype(dtype)             # dtype de almacenamiento de los factores
         # guardamos orden topológico una vez
         self.order = self.bn.topological_order() # self.order: lista de nombres en orden válido para enumeración
+        # Precomputamos un factor por nodo: P(nodo | padres) como arreglo (2,)*(k+1)
+        self.factors = [self._factor_from_node(self.bn.get_node(name)) for name in self.order]
+        # Caché de órdenes de eliminación: (query_var, evidencia congelada) -> orden
+        self._order_cache: Dict[Tuple[str, frozenset], List[str]] = {}
+        # Para memoizar la enumeración: en el nivel i, el subproblema solo depende
+        # de las variables ya asignadas que son padres de alguna variable restante.
+        # self._ctx_vars[i] lista esas variables "de contexto" para order[i:].
+        self._ctx_vars: List[List[str]] = []
+        for i in range(len(self.order) + 1):
+            remaining_parents = set()                   # Padres de las variables aún no procesadas
+            for v in self.order[i:]:
+                remaining_parents.update(self.bn.get_node(v).parents)
+            self._ctx_vars.append([v for v in self.order[:i] if v in remaining_parents])
+        # Caché de subproblemas de enumeración:
+        #   (i, valores del contexto, evidencia futura fijada) -> probabilidad.
+        # Se vacía en cada query porque la evidencia cambia entre consultas.
+        self._enum_cache: Dict[Tuple[int, bytes, Tuple[int, ...]], float] = {}
+        # --- estado de asignación basado en arreglos para la enumeración ---
+        # En lugar de copiar/mutar diccionarios de evidencia en cada nivel de la
+        # recursión, mantenemos un vector de asignación indexado por id entero.
+        n = len(self.order)
+        # La vista SoA de la red aporta ids, padres/hijos en CSR y las CPTs por id
+        self.bn.build_soa()
+        self.vid = self.bn.name_to_id               # Id entero por variable (mismo orden topológico)
+        self._nodes = [self.bn.get_node(name) for name in self.order]  # Nodo por id (solo para trazas/descripciones)
+        self._assign = np.zeros(n, dtype=np.int8)   # Valor asignado (0/1) de cada variable, por id
+        self._is_set = np.zeros(n, dtype=bool)      # Si la variable está asignada actualmente
+        # Ids de los padres de cada variable: vistas sobre la fila CSR de la red
+        # (gather contiguo en vez de k hashes de dict)
+        par_indptr, par_data = self.bn.parents_csr
+        self._parent_ids = [par_data[par_indptr[i]:par_indptr[i + 1]] for i in range(n)]
+        # Pares (nombre, id) de los padres de cada nodo, ya ordenados
+        # alfabéticamente: la traza los formatea sin sorted() por llamada
+        self._sorted_parents = [sorted((p, self.vid[p]) for p in self._nodes[i].parents)
+                                for i in range(n)]
+        # Ids de las variables de contexto por nivel (para la clave de la caché)
+        self._ctx_ids = [np.array([self.vid[v] for v in ctx], dtype=np.int32)
+                         for ctx in self._ctx_vars]
+        self._fixed_ids: List[int] = []             # Ids fijados por la consulta actual (orden ascendente)
+        # --- SoA: todas las CPTs empaquetadas en un solo arreglo plano ---
+        # En vez de tocar un arreglo pequeño por nodo (memoria dispersa), las
+        # CPTs viven contiguas en self.cpt_flat; cada nodo guarda su offset y
+        # los strides (potencias de 2, orden C) para indexar por sus padres.
+        self._par_strides = [2 ** np.arange(ids.size - 1, -1, -1, dtype=np.int64)
+                             for ids in self._parent_ids]
+        flats = [np.ascontiguousarray(cpt, dtype=np.float64).ravel()
+                 for cpt in self.bn.cpt_arrays]
+        self.cpt_off = np.zeros(n, dtype=np.int64)  # Offset de la CPT de cada nodo en cpt_flat
+        offset = 0
+        for i, flat in enumerate(flats):
+            self.cpt_off[i] = offset
+            offset += flat.size
+        self.cpt_flat = np.concatenate(flats) if flats else np.zeros(0, dtype=np.float64)
+        # Layout CSR de padres y strides para el núcleo de enumeración: el
+        # indptr y los ids vienen directo de la vista SoA de la red; solo los
+        # strides se concatenan aquí, alineados con las filas de padres.
+        self.par_off, self.par_ids_flat = self.bn.parents_csr
+        self.par_strides_flat = (np.concatenate(self._par_strides)
+                                 if n else np.zeros(0, dtype=np.int64))
+
+    # --- construcción de factores para VE ---
+    def _factor_from_node(self, node: BayesianNode,
+                          evidence: Optional[Dict[str, bool]] = None) -> Factor:
+        """
+        Convierte la CPT de un nodo en un Factor sobre (padres libres..., nodo),
+        aplicando la evidencia durante la construcción: los ejes observados
+        nunca se materializan (se rebana la CPT antes de duplicarla para el
+        eje del nodo), en lugar de construir el factor completo y recortarlo.
+        El último eje corresponde al propio nodo; índice 1 = True, 0 = False.
+        """
+        evidence = evidence or {}
+        # Rebanamos primero los padres observados sobre la CPT (2,)*k:
+        # slice(None) conserva el eje; un entero lo colapsa al valor observado
+        cpt = node.cpt_true[tuple(int(evidence[p]) if p in evidence else slice(None)
+                                  for p in node.parents)]
+        free_parents = [p for p in node.parents if p not in evidence]  # Ejes que sobreviven
+        if node.name in evidence:
+            # El propio nodo está observado: no hace falta el eje extra,
+            # basta con P(True|...) o su complemento según el valor observado
+            arr = np.asarray(cpt if evidence[node.name] else 1.0 - cpt, dtype=self.dtype)
+            return Factor(vars=free_parents, values=arr)
+        # Apilamos el complemento en un último eje solo sobre las celdas libres:
+        # índice 0 = nodo False, índice 1 = nodo True
+        arr = np.stack([1.0 - cpt, cpt], axis=-1).astype(self.dtype)
+        return Factor(vars=free_parents + [node.name], values=arr)  # Variables en orden (padres..., nodo)
+
+    @staticmethod
+    def _multiply(f: Factor, g: Factor) -> Factor:
+        """
+        Producto punto a punto de dos factores (unión de variables).
+
+        Se delega en np.einsum con un mapeo variable -> letra: la alineación
+        de ejes, la expansión y la multiplicación ocurren en una sola llamada
+        a nivel C, sin transponer ni reservar arreglos intermedios.
+        """
+        union = list(f.vars) + [v for v in g.vars if v not in f.vars]  # Variables combinadas
+        # Asignamos una letra de subíndice einsum a cada variable de la unión
+        letters = {v: EINSUM_LETTERS[i] for i, v in enumerate(union)}
+        sub_f = "".join(letters[v] for v in f.vars)    # Subíndices de f en su orden de ejes
+        sub_g = "".join(letters[v] for v in g.vars)    # Subíndices de g en su orden de ejes
+        sub_out = "".join(letters[v] for v in union)   # Ejes del resultado
+        values = np.einsum(f"{sub_f},{sub_g}->{sub_out}", f.values, g.values)
+        return Factor(vars=union, values=values)
+
+    @classmethod
+    def _sum_out(cls, factor: Factor, var: str) -> Factor:
+        """Elimina 'var' del factor sumando sobre sus dos valores."""
+        axis = factor.vars.index(var)                       # Eje a colapsar
+        new_vars = [v for v in factor.vars if v != var]     # Variables restantes
+        # dtype explícito: la acumulación se hace siempre en float64, aunque
+        # el resultado vuelve al dtype de almacenamiento del factor
+        values = factor.values.sum(axis=axis, dtype=np.float64)
+        if factor.values.dtype != np.float64:
+            values = values.astype(factor.values.dtype)
+        return Factor(vars=new_vars, values=values)
+
+    # --- orden de eliminación ---
+    def best_elimination_order(self, query_var: str, evidence: Dict[str, bool]) -> List[str]:
+        """
+        Calcula un orden de eliminación para las variables ocultas usando la
+        heurística min-fill sobre el grafo moralizado: en cada paso se elimina
+        la variable que introduce menos aristas nuevas entre sus vecinos.
+
+        El orden topológico es válido pero suele ser malo como orden de
+        eliminación (infla los factores intermedios); min-fill mantiene
+        pequeños los factores cuando el treewidth de la red lo permite.
+        Se cachea por (query_var, evidencia) porque la evidencia cambia el
+        conjunto de variables ocultas.
+        """
+        cache_key = (query_var, frozenset(evidence.keys()))  # La evidencia define qué queda oculto
+        if cache_key in self._order_cache:
+            return self._order_cache[cache_key]
+
+        # 1) Grafo moralizado: nodo-padre y padre-padre quedan conectados
+        adjacency: Dict[str, set] = {name: set() for name in self.bn.nodes}
+        for name, node in self.bn.nodes.items():
+            for p in node.parents:                      # Arista nodo <-> cada padre
+                adjacency[name].add(p)
+                adjacency[p].add(name)
+            for a, b in itertools.combinations(node.parents, 2):  # "Casar" a los padres entre sí
+                adjacency[a].add(b)
+                adjacency[b].add(a)
+
+        # 2) Solo se eliminan las variables ocultas (ni consulta ni evidencia)
+        keep = {query_var} | set(evidence.keys())       # Estas nunca entran al orden
+        remaining = set(self.bn.nodes) - keep
+
+        # 3) Greedy min-fill: elegir la variable con menos aristas de relleno
+        order: List[str] = []
+        while remaining:
+            best_var: Optional[str] = None
+            best_fill = None
+            for v in sorted(remaining):                 # sorted() para un desempate estable
+                neighbors = adjacency[v] - {v}      # Vecinos actuales de v en el grafo
+                # Aristas de relleno: pares de vecinos aún no adyacentes
+                fill = sum(1 for a, b in itertools.combinations(sorted(neighbors), 2)
+                           if b not in adjacency[a])
+                if best_fill is None or fill < best_fill:
+                    best_var, best_fill = v, fill
+            order.append(best_var)
+            # Conectar en clique a los vecinos de la variable eliminada (aristas de relleno)
+            neighbors = adjacency[best_var] - {best_var}
+            for a, b in itertools.combinations(neighbors, 2):
+                adjacency[a].add(b)
+                adjacency[b].add(a)
+            # Quitar la variable del grafo
+            for n in neighbors:
+                adjacency[n].discard(best_var)
+            del adjacency[best_var]
+            remaining.discard(best_var)
+
+        self._order_cache[cache_key] = order            # Memorizamos para consultas repetidas
+        return order
+
+    def _relevant_nodes(self, query_var: str, evidence: Dict[str, bool]) -> set:
+        """
+        Conjunto de nodos relevantes para P(query_var | evidence): la consulta,
+        la evidencia y todos sus ancestros (BFS inverso sobre los padres).
+
+        Los nodos fuera de este conjunto son "estériles" (hojas no observadas
+        o sus descendientes): su factor suma exactamente 1 al eliminarlos, así
+        que podemos descartarlos antes de VE sin alterar el resultado.
+        """
+        relevant: set = set()
+        frontier = [query_var] + list(evidence.keys())  # Partimos de consulta + evidencia
+        while frontier:
+            v = frontier.pop()
+            if v in relevant:                           # Ya visitado
+                continue
+            relevant.add(v)
+            frontier.extend(self.bn.get_node(v).parents)  # Subimos hacia los ancestros
+        return relevant
 
-    def query(self, query_var: str, evidence: Dict[str, bool], trace: bool = True) -> Dict[bool, float]:
+    def query(self, query_var: str, evidence: Dict[str, bool], trace: bool = True,
+              method: str = "ve") -> Dict[bool, float]:
         """
         Devuelve la distribución P(query_var | evidence) como {True: p, False: p}.
-        Si trace=True, imprime la traza paso a paso.
+        method: "ve" (eliminación de variables, por defecto) o "enum" (enumeración clásica).
+        Si trace=True, imprime la traza paso a paso del método elegido.
         """
         if query_var not in self.bn.nodes:                        # Validamos que exista la variable consultada
             raise KeyError(f"La variable de consulta '{query_var}' no existe en la red.")
 
+        if method == "ve":                                        # Método por defecto: eliminación de variables
+            return self._query_ve(query_var, evidence, trace)
+        elif method != "enum":                                    # Solo aceptamos los dos métodos conocidos
+            raise ValueError(f"Método de inferencia desconocido: '{method}' (usa 've' o 'enum').")
+
+        # --- enumeración clásica (method="enum") ---
+        self._enum_cache.clear()  # La caché de subproblemas solo vale dentro de una misma consulta
+        # Ids fijados por esta consulta: evidencia + variable de consulta
+        self._fixed_ids = sorted({self.vid[v] for v in evidence} | {self.vid[query_var]})
         # Construimos el vector de resultados para X=True y X=False
         distro = {}  # distro almacenará prob. no normalizadas para {True: val, False: val}
         for x_val in [True, False]:  # Evaluamos ambos casos de la variable consulta
-            # evidence_extiende = evidence ∪ {X=x_val}
-            extended_evidence = evidence.copy()     # Copiamos la evidencia original para no mutarla
-            extended_evidence[query_var] = x_val    # Fijamos la variable consultada a True o False
+            # Cargamos el vector de asignación: evidencia ∪ {X=x_val}
+            # (sin copiar diccionarios; solo escrituras sobre arreglos preasignados)
+            self._is_set[:] = False                 # Des-asignamos todo
+            for var, val in evidence.items():       # Fijamos la evidencia original
+                j = self.vid[var]
+                self._is_set[j] = True
+                self._assign[j] = 1 if val else 0
+            jq = self.vid[query_var]                # Fijamos la variable consultada a True o False
+            self._is_set[jq] = True
+            self._assign[jq] = 1 if x_val else 0
 
             if trace:  # Si queremos ver la traza, imprimimos encabezado del caso
                 print("----------------------------------------------------")
@@ -302,13 +715,24 @@ class InferenceEngine:
                 print("----------------------------------------------------")
 
             # Enumerar sobre todas las variables en orden
-            p = self._enumerate_all(self.order, extended_evidence, trace)  # p es el valor proporcional P(x,e)
+            if trace:
+                p = self._enumerate_all_trace(0)   # Recursión con traza paso a paso
+            elif HAVE_NUMBA:
+                # Núcleo compilado por Numba sobre los arreglos planos
+                p = float(_enumerate_all_kernel(0, len(self.order), self._assign,
+                                                self._is_set, self.cpt_flat,
+                                                self.cpt_off, self.par_ids_flat,
+                                                self.par_off, self.par_strides_flat))
+            else:
+                p = self._enumerate_all_fast(0)    # Recursión Python sin traza (memoizada)
+            # p es el valor proporcional P(x,e)
             if trace:
                 print(f"Resultado parcial: P({query_var}={'T' if x_val else 'F'} | evidencia) ∝ {p}\n")
             distro[x_val] = p  # Guardamos el resultado proporcional para este valor de X
 
-        # Normalizar
-        total = distro[True] + distro[False]  # Suma total para normalizar
+        # Normalizar (suma compensada: evita que la deriva numérica de muchos
+        # productos pequeños deje un total espuriamente igual a 0)
+        total = math.fsum([distro[True], distro[False]])  # Suma total para normalizar
         if total == 0.0:                      # Prevención: no debería pasar con CPTs válidas
             raise ZeroDivisionError("La suma de probabilidades es 0; revisa CPTs/evidencia.")
         distro[True] /= total   # Normalizamos el caso True
@@ -322,63 +746,318 @@ class InferenceEngine:
 
         return distro  # Retornamos el diccionario {True: p, False: p}
 
-    def _enumerate_all(self, vars_in_order: List[str], evidence: Dict[str, bool], trace: bool) -> float:
+    def _query_ve(self, query_var: str, evidence: Dict[str, bool], trace: bool) -> Dict[bool, float]:
+        """
+        Eliminación de variables: restringe cada factor por la evidencia,
+        elimina las variables ocultas una a una (producto + suma) y
+        normaliza el factor resultante sobre la variable de consulta.
+        """
+        # 1) Poda de nodos estériles: solo conservamos los factores relevantes
+        relevant = self._relevant_nodes(query_var, evidence)
+        # 2) Factores relevantes con la evidencia aplicada: los factores sin
+        # variables observadas se reutilizan tal cual del precomputo; los
+        # demás se construyen ya restringidos (sin materializar ejes fijados)
+        factors = []
+        for i, name in enumerate(self.order):
+            if name not in relevant:
+                continue
+            node = self._nodes[i]
+            if name in evidence or any(p in evidence for p in node.parents):
+                factors.append(self._factor_from_node(node, evidence))  # Construcción fusionada
+            else:
+                factors.append(self.factors[i])                         # Factor precomputado intacto
+
+        # 3) Variables ocultas en orden min-fill (mejor que el orden topológico)
+        hidden = [v for v in self.best_elimination_order(query_var, evidence) if v in relevant]
+
+        if trace:
+            print("----------------------------------------------------")
+            print(f"VE: P({query_var} | {self._fmt_ev(evidence)})")
+            print(f"Orden de eliminación: {', '.join(hidden) if hidden else '(ninguna oculta)'}")
+            print("----------------------------------------------------")
+
+        # 4) Eliminar cada variable oculta
+        factors = self._eliminate_hidden(factors, hidden, trace)
+
+        # 5) Multiplicar lo que queda (factores sobre la consulta y constantes de evidencia)
+        result = self._multiply_all(factors)
+
+        # 6) Normalizar sobre la variable de consulta (suma compensada)
+        axis_vals = result.values.reshape(2)      # A esta altura solo queda el eje de query_var
+        total = math.fsum([float(axis_vals[0]), float(axis_vals[1])])
+        if total == 0.0:                          # Prevención: no debería pasar con CPTs válidas
+            raise ZeroDivisionError("La suma de probabilidades es 0; revisa CPTs/evidencia.")
+        distro = {True: float(axis_vals[1]) / total, False: float(axis_vals[0]) / total}
+
+        if trace:  # Imprimimos los resultados finales ya normalizados
+            print("====== Distribución normalizada ======")
+            print(f"P({query_var}=T | evidencia) = {distro[True]:.6f}")
+            print(f"P({query_var}=F | evidencia) = {distro[False]:.6f}")
+            print("=====================================\n")
+
+        return distro  # Mismo formato que la enumeración: {True: p, False: p}
+
+    def _eliminate_hidden(self, factors: List[Factor], hidden: List[str],
+                          trace: bool) -> List[Factor]:
+        """
+        Bucle central de VE: para cada variable oculta, multiplica los
+        factores que la mencionan, la suma fuera y reincorpora el resultado.
+        Devuelve la lista de factores restantes.
+        """
+        for var in hidden:
+            # Separamos los factores que mencionan 'var' de los que no
+            touching = [f for f in factors if var in f.vars]
+            factors = [f for f in factors if var not in f.vars]
+            if not touching:            # Puede pasar si la variable ya fue absorbida
+                continue
+            # Producto punto a punto de todos los factores que tocan 'var'
+            product = self._multiply_all(touching)
+            # Sumamos sobre var y devolvemos el resultado a la lista
+            summed = self._sum_out(product, var)
+            factors.append(summed)
+            if trace:
+                print(f"[Eliminar] {var}: producto de {len(touching)} factor(es) "
+                      f"-> factor sobre ({', '.join(summed.vars) if summed.vars else 'constante'})")
+        return factors
+
+    @classmethod
+    def _multiply_all(cls, factors: List[Factor]) -> Factor:
+        """Producto punto a punto de una lista no vacía de factores."""
+        result = factors[0]
+        for f in factors[1:]:
+            result = cls._multiply(result, f)
+        return result
+
+    # Máximo de variables de evidencia para el factor conjunto de query_batch;
+    # por encima de esto el factor (2^(k+1) celdas) deja de ser rentable.
+    BATCH_MAX_EVIDENCE_VARS = 16
+
+    def query_batch(self, query_var: str,
+                    evidence_list: List[Dict[str, bool]]) -> List[Dict[bool, float]]:
+        """
+        Responde muchas consultas P(query_var | e) con distintas evidencias
+        en una sola pasada de VE.
+
+        En lugar de repetir la eliminación por cada evidencia, se eliminan una
+        sola vez las variables verdaderamente ocultas (las que no aparecen en
+        ninguna evidencia), dejando un factor conjunto sobre la consulta y las
+        variables de evidencia. Cada consulta individual se responde indexando
+        ese factor por su evidencia, marginalizando las no observadas y
+        normalizando. Si el conjunto de variables de evidencia es demasiado
+        grande para el factor conjunto, se recurre a una VE por consulta.
         """
-        Implementa la función recursiva enumerate_all.
-        vars_in_order: lista de nombres en orden topológico.
-        evidence: dict con asignaciones actuales (parciales o completas).
+        if query_var not in self.bn.nodes:       # Misma validación que query()
+            raise KeyError(f"La variable de consulta '{query_var}' no existe en la red.")
+        # Variables de evidencia: unión sobre todas las consultas del lote
+        ev_vars = sorted({v for ev in evidence_list for v in ev})
+        if query_var in ev_vars:
+            raise ValueError(f"La variable de consulta '{query_var}' aparece como evidencia en el lote.")
+        if len(ev_vars) > self.BATCH_MAX_EVIDENCE_VARS:
+            # Demasiados ejes para el factor conjunto: VE independiente por consulta
+            return [self._query_ve(query_var, ev, trace=False) for ev in evidence_list]
+
+        # VE una sola vez, sin restringir por evidencia: solo se eliminan las
+        # variables que no son ni consulta ni evidencia de ninguna entrada
+        pseudo_evidence = {v: True for v in ev_vars}  # Solo las claves importan aquí
+        relevant = self._relevant_nodes(query_var, pseudo_evidence)
+        factors = [self.factors[i] for i, name in enumerate(self.order) if name in relevant]
+        hidden = [v for v in self.best_elimination_order(query_var, pseudo_evidence)
+                  if v in relevant]
+        joint = self._multiply_all(self._eliminate_hidden(factors, hidden, trace=False))
+
+        # Responder cada consulta indexando el factor conjunto
+        results: List[Dict[bool, float]] = []
+        q_probs = np.empty(2, dtype=np.float64)   # Reutilizamos el par (False, True)
+        for ev in evidence_list:
+            # Fijamos los ejes observados; los demás quedan como slice completo
+            index = tuple(int(ev[v]) if v in ev else slice(None) for v in joint.vars)
+            arr = joint.values[index]
+            rest = [v for v in joint.vars if v not in ev]  # Ejes que sobreviven al indexado
+            # Marginalizamos todo lo no observado salvo la variable de consulta
+            q_axis = rest.index(query_var)
+            q_probs[:] = np.moveaxis(arr, q_axis, 0).reshape(2, -1).sum(axis=1, dtype=np.float64)
+            total = math.fsum([float(q_probs[0]), float(q_probs[1])])
+            if total == 0.0:                      # Evidencia imposible según la red
+                raise ZeroDivisionError("La suma de probabilidades es 0; revisa CPTs/evidencia.")
+            results.append({True: float(q_probs[1]) / total, False: float(q_probs[0]) / total})
+        return results
+
+    def _enumerate_all_fast(self, start: int) -> float:
         """
-        if not vars_in_order:  # Caso base: si no quedan variables por procesar
+        Versión sin traza de enumerate_all sobre self.order[start:], escrita
+        como bucle con pila explícita en lugar de recursión: cada llamada
+        recursiva costaría ~1µs de marco del intérprete por nivel, y aquí los
+        "marcos" son listas pequeñas que se apilan y desapilan en el mismo
+        bucle. La semántica es idéntica a la recursión: memoización por
+        (nivel, contexto, evidencia futura fijada), poda de ramas con P=0 y
+        suma compensada de las contribuciones.
+
+        La asignación actual vive en self._assign / self._is_set (vectores
+        indexados por id entero); extender o retirar una asignación es una
+        escritura sobre un arreglo preasignado.
+        """
+        n = len(self.order)
+        assign = self._assign        # Alias locales para el camino caliente
+        is_set = self._is_set
+        cache = self._enum_cache
+        # Marcos pendientes. Dos formas:
+        #   ['fijada', i, clave, prob]                     -> multiplicar al regresar
+        #   ['suma', i, clave, ramas, contribs, prob_rama] -> acumular y lanzar la
+        #                                                     siguiente rama (y, prob)
+        stack: list = []
+        value: Optional[float] = None  # Valor que "regresa" del nivel inferior
+        i = start
+
+        while True:
+            # --- fase de descenso: resolver el nivel i o apilar un marco ---
+            while value is None:
+                if i == n:             # Caso base: producto neutro
+                    value = 1.0
+                    break
+                # El subproblema depende del contexto (padres ya asignados de lo
+                # que resta) y de la evidencia fijada sobre las variables aún no
+                # procesadas (incluye a la variable de consulta extendida).
+                cache_key = (i,
+                             assign[self._ctx_ids[i]].tobytes(),
+                             tuple(int(assign[j]) for j in self._fixed_ids if j >= i))
+                cached = cache.get(cache_key)
+                if cached is not None:  # Subproblema ya resuelto en otra rama
+                    value = cached
+                    break
+                # Índice plano de la CPT: gather de padres + producto con strides
+                par_ids = self._parent_ids[i]
+                if par_ids.size:
+                    flat_index = int((assign[par_ids] * self._par_strides[i]).sum())
+                else:
+                    flat_index = 0  # Nodo raíz: su CPT ocupa una sola celda
+                p_true = float(self.cpt_flat[self.cpt_off[i] + flat_index])
+
+                if is_set[i]:           # Variable fijada: multiplicar y descender
+                    prob = p_true if assign[i] else 1.0 - p_true
+                    if prob == 0.0:     # Poda: el subárbol entero se anula
+                        cache[cache_key] = 0.0
+                        value = 0.0
+                        break
+                    stack.append(["fijada", i, cache_key, prob])
+                    i += 1              # Descendemos al siguiente nivel
+                else:                   # Variable oculta: sumar sobre T y F
+                    # Ramas con probabilidad no nula (poda de las P=0)
+                    branches = [(y, p_true if y else 1.0 - p_true) for y in (1, 0)
+                                if (p_true if y else 1.0 - p_true) != 0.0]
+                    if not branches:    # Ambas ramas podadas: la suma es 0
+                        cache[cache_key] = 0.0
+                        value = 0.0
+                        break
+                    is_set[i] = True    # Fijamos temporalmente Y durante las ramas
+                    y_val, prob = branches.pop(0)  # Lanzamos la primera rama
+                    assign[i] = y_val
+                    stack.append(["suma", i, cache_key, branches, [], prob])
+                    i += 1
+
+            # --- fase de retorno: entregar 'value' al marco superior ---
+            while value is not None:
+                if not stack:           # No hay marcos: terminó el nivel 'start'
+                    return value
+                frame = stack[-1]
+                if frame[0] == "fijada":
+                    stack.pop()
+                    result = frame[3] * value      # prob * subárbol
+                    cache[frame[2]] = result       # Memorizamos este subproblema
+                    value = result                 # Sigue subiendo
+                else:  # "suma"
+                    frame[4].append(frame[5] * value)  # prob_rama * subárbol
+                    if frame[3]:                   # Quedan ramas por explorar
+                        y_val, prob = frame[3].pop(0)
+                        assign[frame[1]] = y_val   # Nueva rama de Y
+                        frame[5] = prob
+                        i = frame[1] + 1
+                        value = None               # Volvemos a descender
+                    else:                          # Ambas ramas resueltas
+                        stack.pop()
+                        is_set[frame[1]] = False   # Retiramos Y
+                        total = math.fsum(frame[4])  # Suma compensada de las ramas
+                        cache[frame[2]] = total
+                        value = total
+
+    def _enumerate_all_trace(self, i: int) -> float:
+        """
+        Versión con traza de enumerate_all sobre self.order[i:]: imprime cada
+        paso (variable fijada, suma sobre T/F, podas y totales) con fines
+        didácticos. No usa la caché de subproblemas, porque la traza debe
+        reflejar el recorrido completo del árbol de enumeración.
+        """
+        if i == len(self.order):  # Caso base: si no quedan variables por procesar
             # Caso base: no hay más variables -> multiplicador neutro
-            return 1.0         # Devolvemos 1 para no afectar el producto
+            return 1.0            # Devolvemos 1 para no afectar el producto
 
-        # Tomar la primera variable y el resto
-        Y = vars_in_order[0]   # Y es la siguiente variable a procesar
-        rest = vars_in_order[1:]  # rest son el resto de variables por procesar después de Y
-        node = self.bn.get_node(Y)  # node es el objeto BayesianNode asociado a Y
+        assign = self._assign
+        # Tomar la variable de este nivel
+        node = self._nodes[i]       # Nodo de la variable i (lista por id, sin lookup de dict)
+        Y = node.name               # Y es la siguiente variable a procesar
 
-        # Preparar asignación de padres de Y desde 'evidence'
-        parent_assignment = {p: evidence[p] for p in node.parents}  # Tomamos los valores actuales de los padres
+        # Índice plano de la CPT a partir de los padres actuales
+        par_ids = self._parent_ids[i]
+        if par_ids.size:
+            flat_index = int((assign[par_ids] * self._par_strides[i]).sum())
+        else:
+            flat_index = 0  # Nodo raíz: su CPT ocupa una sola celda
+        p_true = float(self.cpt_flat[self.cpt_off[i] + flat_index])  # P(Y=True | padres actuales)
+        parents_str = self._fmt_parents(i)  # Padres formateados (orden precalculado)
 
-        if Y in evidence:  # Si Y ya está fijada por evidencia (original o extendida)
+        if self._is_set[i]:  # Si Y ya está fijada por evidencia (original o extendida)
             # Y ya está fijada (en evidencia extendida)
-            y_val = evidence[Y]                           # y_val es el valor booleano concreto de Y
+            y_val = bool(assign[i])                       # y_val es el valor booleano concreto de Y
             # P(Y=y | padres)
-            prob = node.p_value_given(y_val, parent_assignment)  # prob = P(Y=y_val|padres)
+            prob = p_true if y_val else 1.0 - p_true      # prob = P(Y=y_val|padres)
 
-            if trace:
-                print(f"[Fijada] {Y} = {'T' if y_val else 'F'}  =>  "
-                      f"P({Y}={'T' if y_val else 'F'} | {self._fmt_parent_assign(parent_assignment)}) = {prob}")
+            print(f"[Fijada] {Y} = {'T' if y_val else 'F'}  =>  "
+                  f"P({Y}={'T' if y_val else 'F'} | {parents_str}) = {prob}")
 
+            # Poda: si P(Y=y|padres)=0 el subárbol entero se multiplica por 0
+            if prob == 0.0:
+                print(f"  [Poda] P=0: no se explora el subárbol de {Y}")
+                return 0.0
             # Continuar con el resto
-            return prob * self._enumerate_all(rest, evidence, trace)  # Multiplicamos y descendemos recursivamente
+            return prob * self._enumerate_all_trace(i + 1)  # Multiplicamos y descendemos recursivamente
         else:
             # Y no está fijada -> sumar sobre Y ∈ {True, False}
-            total = 0.0  # total acumulará la suma de ambas ramas (True y False)
-            if trace:
-                print(f"[Suma] {Y} no está en evidencia; sumamos sobre T y F dado {self._fmt_parent_assign(parent_assignment)}")
+            contribs: List[float] = []  # Contribuciones de cada rama; se suman compensadas al final
+            print(f"[Suma] {Y} no está en evidencia; sumamos sobre T y F dado {parents_str}")
 
+            self._is_set[i] = True       # Fijamos temporalmente Y durante las dos ramas
             for y_val in [True, False]:  # Exploramos ambas asignaciones posibles de Y
-                prob = node.p_value_given(y_val, parent_assignment)  # P(Y=y_val|padres)
-                # Extender evidencia temporalmente con Y=y_val
-                evidence[Y] = y_val  # Fijamos temporalmente Y en la evidencia para la recursión
+                prob = p_true if y_val else 1.0 - p_true  # P(Y=y_val|padres)
+                # Poda: una rama con probabilidad 0 no aporta a la suma
+                if prob == 0.0:
+                    print(f"  - {Y}={'T' if y_val else 'F'}: P=0  => rama podada")
+                    continue
+                assign[i] = 1 if y_val else 0             # Escritura directa en el vector de asignación
                 # Llamada recursiva
-                sub = self._enumerate_all(rest, evidence, trace)  # sub es el producto de abajo con Y fijada
-                # Retirar Y para no contaminar otras ramas
-                del evidence[Y]  # Eliminamos Y para dejar la evidencia como estaba
-
-                contrib = prob * sub  # contrib es la contribución de esta rama a la suma total
-                total += contrib      # Acumulamos
+                sub = self._enumerate_all_trace(i + 1)    # sub es el producto de abajo con Y fijada
 
-                if trace:
-                    print(f"  - {Y}={'T' if y_val else 'F'}: "
-                          f"P={prob} * sub={sub}  => contribución={contrib}")
+                contrib = prob * sub   # contrib es la contribución de esta rama a la suma total
+                contribs.append(contrib)  # Acumulamos para la suma compensada
 
-            if trace:
-                print(f"[Total] Suma para {Y}: {total}\n")
+                print(f"  - {Y}={'T' if y_val else 'F'}: "
+                      f"P={prob} * sub={sub}  => contribución={contrib}")
+            self._is_set[i] = False      # Retiramos Y para no contaminar otras ramas
 
+            total = math.fsum(contribs)  # Suma compensada de las ramas (math.fsum)
+            print(f"[Total] Suma para {Y}: {total}\n")
             return total  # Retornamos la suma de las dos ramas
 
+    def _fmt_parents(self, i: int) -> str:
+        """
+        Formatea la asignación actual de los padres de order[i] como "A=T,B=F"
+        (orden alfabético). Usa la lista de padres pre-ordenada en __init__ y
+        lee directo del vector de asignación: nada de dicts ni sorted() por
+        llamada, solo el costo del f-string.
+        """
+        pairs = self._sorted_parents[i]  # [(nombre, id), ...] ya ordenados
+        if not pairs:                    # Si no hay padres...
+            return "(sin padres)"        # Texto claro
+        return ",".join(f"{p}={'T' if self._assign[j] else 'F'}" for p, j in pairs)
+
     @staticmethod
     def _fmt_ev(ev: Dict[str, bool]) -> str:
         """Imprime evidencia tipo {A=T, B=F} (orden alfabético solo para estética)."""